@@ -5,19 +5,54 @@
 # Original author: Rylie Pavlik <rylie.pavlik@collabora.com>
 """Common utilities for command line modules."""
 
+import importlib
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 import click
-from dataclasses_json import LetterCase, dataclass_json
 
-from ..gp import GPParameters
+if TYPE_CHECKING:
+    from ..gp import GP, GPParameters
 
 _LOG = logging.getLogger(__name__)
+_LOG_LOAD_GP = _LOG.getChild("load_or_generate_gp_params")
+_LOG_LOCK_KEY = _LOG.getChild("change_gp_lock_key")
 
 
-@click.group()
+class LazyGroup(click.Group):
+    """A click group that only imports a subcommand's module when it is used."""
+
+    def __init__(self, *args, lazy_subcommands: Optional[dict[str, str]] = None, **kw):
+        """
+        Initialize the group.
+
+        lazy_subcommands maps command names to "module:attribute" strings.
+        """
+        super().__init__(*args, **kw)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        """List both the eagerly-registered and the lazy subcommands."""
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        """Look up a subcommand, importing its module if needed."""
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+        module_name, attr = self.lazy_subcommands[cmd_name].split(":")
+        return getattr(importlib.import_module(module_name), attr)
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "produce": "cardproduction.cli.produce_gids:produce",
+        "produce-smartpgp": "cardproduction.cli.produce_smartpgp:produce",
+        "gp": "cardproduction.cli.generate:gp",
+        "gids-init": "cardproduction.cli.generate:gids_init",
+    },
+)
 @click.option(
     "-v",
     "--verbose",
@@ -28,15 +63,27 @@ _LOG = logging.getLogger(__name__)
 )
 @click.pass_context
 def common(ctx, verbose):
-    if verbose:
-        logging.basicConfig(level=logging.DEBUG)
-    else:
-        logging.basicConfig(level=logging.INFO)
-    ctx.ensure_object(dict)
-    ctx.obj["verbose"] = verbose
+    setup_command(ctx, verbose)
+
+
+def setup_command(ctx: click.Context, verbose: bool) -> bool:
+    """
+    Set up logging and the context object, returning whether to be verbose.
+
+    Only the outermost command configures logging: a command run beneath
+    another one (like the common group) reuses its settings, though its own
+    --verbose still turns on debug logging.
+    """
+    obj = ctx.ensure_object(dict)
+    if "verbose" not in obj:
+        logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
+        obj["verbose"] = verbose
+    elif verbose and not obj["verbose"]:
+        logging.getLogger().setLevel(logging.DEBUG)
+        obj["verbose"] = True
+    return obj["verbose"]
 
 
-@dataclass_json(letter_case=LetterCase.SNAKE)  # type: ignore
 @dataclass
 class GPConfig:
     """Parameters for setting up GP."""
@@ -44,10 +91,17 @@ class GPConfig:
     current_parameters_filename: Optional[str] = None
     desired_parameters_filename: Optional[str] = None
 
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "GPConfig":
+        """Construct from the corresponding table of a production file."""
+        return cls(**d)
 
-def load_or_generate_gp_params(filename) -> GPParameters:
+
+def load_or_generate_gp_params(filename) -> "GPParameters":
     """Load a GP parameters file, if one exists, or generate one."""
-    log = _LOG.getChild("load_or_generate_gp_params")
+    from ..gp import GPParameters
+
+    log = _LOG_LOAD_GP
     loaded = None
     try:
         log.info(
@@ -67,3 +121,65 @@ def load_or_generate_gp_params(filename) -> GPParameters:
     ret = GPParameters.generate()
     ret.write_toml(filename)
     return ret
+
+
+def load_gp_config_params(
+    gp_config: GPConfig,
+) -> tuple[Optional["GPParameters"], Optional["GPParameters"]]:
+    """
+    Load the current and desired GP parameters named in a GPConfig.
+
+    Returns a (current, desired) tuple, where None means the default key.
+    The desired parameters are generated if their file does not exist yet.
+    """
+    from ..gp import GPParameters
+
+    current_gp_parameters: Optional[GPParameters] = None
+    desired_gp_parameters: Optional[GPParameters] = None
+
+    # Keep these in order, not concurrent: both may name the same file, which
+    # must be generated and written as the desired one before it is read back.
+    if gp_config.desired_parameters_filename:
+        desired_gp_parameters = load_or_generate_gp_params(
+            gp_config.desired_parameters_filename
+        )
+
+    if gp_config.current_parameters_filename:
+        # This one must exists, makes no sense to generate the current keys randomly
+        current_gp_parameters = GPParameters.load_toml(
+            gp_config.current_parameters_filename
+        )
+
+    return current_gp_parameters, desired_gp_parameters
+
+
+def change_gp_lock_key(
+    gp: "GP",
+    current_gp_parameters: Optional["GPParameters"],
+    desired_gp_parameters: Optional["GPParameters"],
+    verbose=False,
+):
+    """Change the GP lock key, if the desired one differs from the current one."""
+    from ..gp import DEFAULT_GP_PARAMETERS
+
+    log = _LOG_LOCK_KEY
+    # Compare the effective keys, since None means the default key: a desired
+    # file that happens to hold the default key needs no gp run on a new card.
+    if (desired_gp_parameters or DEFAULT_GP_PARAMETERS) == (
+        current_gp_parameters or DEFAULT_GP_PARAMETERS
+    ):
+        log.info("GP lock key is already as desired, not changing it")
+    elif desired_gp_parameters is None:
+        log.info("Changing the GP lock key back to default")
+        gp.lock_card(
+            DEFAULT_GP_PARAMETERS,
+            current_params=current_gp_parameters,
+            verbose=verbose,
+        )
+    else:
+        log.info("Changing the GP lock key")
+        gp.lock_card(
+            desired_gp_parameters,
+            current_params=current_gp_parameters,
+            verbose=verbose,
+        )
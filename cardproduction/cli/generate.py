@@ -11,32 +11,34 @@ import click
 
 
 from .common import common
-from ..gp import GPParameters
-from ..gids import GidsAppletParameters
 
 
 _LOG = logging.getLogger(__name__)
 
 
-@common.command()
+@click.command()
 @click.argument(
     "toml_filename",
     type=click.Path(file_okay=True, dir_okay=False, writable=True),
 )
 def gids_init(toml_filename):
     """Generate GidsApplet card init parameters into a TOML file"""
+    from ..gids import GidsAppletParameters
+
     params = GidsAppletParameters.generate()
     _LOG.info("Writing %s", toml_filename)
     params.write_toml(toml_filename)
 
 
-@common.command()
+@click.command()
 @click.argument(
     "toml_filename",
     type=click.Path(file_okay=True, dir_okay=False, writable=True),
 )
 def gp(toml_filename):
     """Generate GlobalPlatform card parameters into a TOML file"""
+    from ..gp import GPParameters
+
     params = GPParameters.generate()
     _LOG.info("Writing %s", toml_filename)
     params.write_toml(toml_filename)
@@ -7,21 +7,30 @@
 
 import logging
 from dataclasses import dataclass, field
-from typing import List, Optional
-from dataclasses_json import LetterCase, dataclass_json
+from typing import TYPE_CHECKING, Any, List, Optional
 
 import click
-import toml
 
-from .common import GPConfig, load_or_generate_gp_params
-from ..gids import GidsApplet, GidsAppletKeyLoading, GidsAppletParameters
-from ..gp import GPParameters, GP
+from .common import (
+    GPConfig,
+    change_gp_lock_key,
+    load_gp_config_params,
+    setup_command,
+)
+from ..util import load_toml
+
+if TYPE_CHECKING:
+    # Imported where used, so that --help does not pay for them.
+    from ..gids import GidsApplet, GidsAppletKeyLoading, GidsAppletParameters
+    from ..gp import GPParameters, GP
 
 
 _LOG = logging.getLogger(__name__)
+_LOG_LOAD_GIDS = _LOG.getChild("load_or_generate_gids_params")
+_LOG_INSTALL = _LOG.getChild("install_and_init_applet")
+_LOG_PRODUCE = _LOG.getChild("produce")
 
 
-@dataclass_json(letter_case=LetterCase.SNAKE)  # type: ignore
 @dataclass
 class ProcedureConfig:
     """Configure a card production procedure for the Gids applet."""
@@ -29,12 +38,30 @@ class ProcedureConfig:
     gids_parameters_filename: str
     install_and_init_gids: bool
     gp_config: GPConfig = field(default_factory=GPConfig)
-    key_loading: List[GidsAppletKeyLoading] = field(default_factory=list)
+    key_loading: List["GidsAppletKeyLoading"] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "ProcedureConfig":
+        """Construct from the contents of a production file."""
+        from ..gids import GidsAppletKeyLoading
+        from ..pkcs12 import Pkcs12
+
+        return cls(
+            gids_parameters_filename=d["gids_parameters_filename"],
+            install_and_init_gids=d["install_and_init_gids"],
+            gp_config=GPConfig.from_dict(d.get("gp_config", {})),
+            key_loading=[
+                GidsAppletKeyLoading(label=raw["label"], key=Pkcs12(**raw["key"]))
+                for raw in d.get("key_loading", [])
+            ],
+        )
 
 
-def load_or_generate_gids_params(filename) -> GidsAppletParameters:
+def load_or_generate_gids_params(filename) -> "GidsAppletParameters":
     """Load a GidsApplet parameters file, if one exists, or generate one."""
-    log = _LOG.getChild("load_or_generate_gids_params")
+    from ..gids import GidsAppletParameters
+
+    log = _LOG_LOAD_GIDS
     loaded = None
     try:
         log.info(
@@ -57,29 +84,23 @@ def load_or_generate_gids_params(filename) -> GidsAppletParameters:
 
 
 def install_and_init_applet(
-    gp: GP,
-    gids: GidsApplet,
-    gids_parameters: GidsAppletParameters,
+    gp: "GP",
+    gids: "GidsApplet",
+    gids_parameters: "GidsAppletParameters",
     verbose=False,
-    current_params: Optional[GPParameters] = None,
+    current_params: Optional["GPParameters"] = None,
 ):
     """Install the GidsApplet and initialize it, setting pin."""
-    log = _LOG.getChild("install_and_init_applet")
-    # Try uninstalling first
-    log.info("Uninstalling GidsApplet in case it already exists")
-    gp.uninstall(
-        gids.cap_file,
-        current_params=current_params,
-        verbose=verbose,
-    )
-
-    # Install applet
-    log.info("Installing GidsApplet")
-    gp.install(
-        gids.cap_file,
-        current_params=current_params,
-        verbose=verbose,
-    )
+    log = _LOG_INSTALL
+    cap_file = gids.cap_file
+    with gp.batch(current_params=current_params, verbose=verbose) as batch:
+        # Try uninstalling first
+        log.info("Uninstalling GidsApplet in case it already exists")
+        batch.uninstall(cap_file)
+
+        # Install applet
+        log.info("Installing GidsApplet")
+        batch.install(cap_file)
     # Init applet
     click.echo("\n\nPlease remove the card and re-insert it\n\n")
 
@@ -105,36 +126,26 @@ def install_and_init_applet(
     default=False,
     help="Verbose logging",
 )
-def produce(production_file, verbose):
+@click.pass_context
+def produce(ctx, production_file, verbose):
     """Set up a card with GidsApplet and a key/certificate."""
-    if verbose:
-        logging.basicConfig(level=logging.DEBUG)
-    else:
-        logging.basicConfig(level=logging.INFO)
-    log = _LOG.getChild("produce")
-
-    with open(production_file, "r", encoding="utf-8") as fp:
-        config_dict = toml.load(fp)
-        config: ProcedureConfig = ProcedureConfig.from_dict(config_dict)  # type: ignore
+    from ..gids import GidsApplet
+    from ..gp import GP
 
-    import pprint
+    verbose = setup_command(ctx, verbose)
+    log = _LOG_PRODUCE
 
-    pprint.pprint(config)
+    config = ProcedureConfig.from_dict(load_toml(production_file))
 
-    # Load or generate GP parameters, to lock the card when done
-    current_gp_parameters: Optional[GPParameters] = None
-    desired_gp_parameters: Optional[GPParameters] = None
+    if verbose:
+        import pprint
 
-    if config.gp_config.desired_parameters_filename:
-        desired_gp_parameters = load_or_generate_gp_params(
-            config.gp_config.desired_parameters_filename
-        )
+        pprint.pprint(config)
 
-    if config.gp_config.current_parameters_filename:
-        # This one must exists, makes no sense to generate the current keys randomly
-        current_gp_parameters = GPParameters.load_toml(
-            config.gp_config.current_parameters_filename
-        )
+    # Load or generate GP parameters, to lock the card when done
+    current_gp_parameters, desired_gp_parameters = load_gp_config_params(
+        config.gp_config
+    )
 
     # Load GidsApplet init parameters
     gids_parameters = load_or_generate_gids_params(config.gids_parameters_filename)
@@ -156,29 +167,19 @@ def produce(production_file, verbose):
         log.info("Skipping applet uninstall/reinstall")
 
     # Change lock key, if requested
-    if desired_gp_parameters is None and current_gp_parameters is not None:
-        log.info("Changing the GP lock key back to default")
-        gp.lock_card(
-            GPParameters(),
-            current_params=current_gp_parameters,
-            verbose=verbose,
-        )
-    elif (
-        desired_gp_parameters is not None
-        and desired_gp_parameters != current_gp_parameters
-    ):
-        log.info("Changing the GP lock key")
-        gp.lock_card(
-            desired_gp_parameters,
-            current_params=current_gp_parameters,
-            verbose=verbose,
-        )
+    change_gp_lock_key(
+        gp, current_gp_parameters, desired_gp_parameters, verbose=verbose
+    )
 
-    loaded_keys = set(
-        gids.enumerate_certificates(
-            verbose=verbose,
+    # A single listing covers every label: only do it if there's anything to load
+    loaded_keys: set[str] = set()
+    if config.key_loading:
+        loaded_keys.update(
+            gids.enumerate_certificates(
+                verbose=verbose,
+            )
         )
-    )
+    to_load = []
     for loading in config.key_loading:
         if loading.label in loaded_keys:
             log.info(
@@ -186,11 +187,8 @@ def produce(production_file, verbose):
                 loading.label,
             )
         else:
-            gids.import_key(
-                gids_parameters,
-                loading,
-                verbose=verbose,
-            )
+            to_load.append(loading)
+    gids.import_keys(gids_parameters, to_load, verbose=verbose)
 
 
 if __name__ == "__main__":
@@ -8,21 +8,30 @@
 import logging
 from dataclasses import dataclass, field
 import subprocess
-from typing import Optional
-from dataclasses_json import LetterCase, dataclass_json
+from typing import Any, Optional
 
 import click
-import toml
 
-from .common import GPConfig, load_or_generate_gp_params
+from .common import (
+    GPConfig,
+    change_gp_lock_key,
+    load_gp_config_params,
+    setup_command,
+)
 from ..openpgp import OpenPGPAppletInstallParameters, OpenPGPPins, SmartPGPApplet
 from ..gp import GPParameters, GP
+from ..util import load_toml
 
 
 _LOG = logging.getLogger(__name__)
+_LOG_LOAD_INSTALL_PARAMS = _LOG.getChild(
+    "load_or_generate_openpgp_install_params"
+)
+_LOG_LOAD_PINS = _LOG.getChild("load_or_generate_openpgp_pins")
+_LOG_INSTALL = _LOG.getChild("install_and_init_applet")
+_LOG_PRODUCE = _LOG.getChild("produce")
 
 
-@dataclass_json(letter_case=LetterCase.SNAKE)  # type: ignore
 @dataclass
 class PinConfig:
     """Parameters for setting pins."""
@@ -30,8 +39,12 @@ class PinConfig:
     current_pins_filename: Optional[str] = None
     desired_pins_filename: Optional[str] = None
 
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "PinConfig":
+        """Construct from the corresponding table of a production file."""
+        return cls(**d)
+
 
-@dataclass_json(letter_case=LetterCase.SNAKE)  # type: ignore
 @dataclass
 class ProcedureConfig:
     """Configure a card production procedure for the SmartPGP applet."""
@@ -42,10 +55,22 @@ class ProcedureConfig:
     pin_config: PinConfig = field(default_factory=PinConfig)
     # key_loading: List[GidsAppletKeyLoading] = field(default_factory=list)
 
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "ProcedureConfig":
+        """Construct from the contents of a production file."""
+        return cls(
+            openpgp_install_parameters_filename=d[
+                "openpgp_install_parameters_filename"
+            ],
+            install_smartpgp=d["install_smartpgp"],
+            gp_config=GPConfig.from_dict(d.get("gp_config", {})),
+            pin_config=PinConfig.from_dict(d.get("pin_config", {})),
+        )
+
 
 def load_or_generate_openpgp_install_params(filename) -> OpenPGPAppletInstallParameters:
     """Load an OpenPGP install parameters file, if one exists, or generate one."""
-    log = _LOG.getChild("load_or_generate_openpgp_install_params")
+    log = _LOG_LOAD_INSTALL_PARAMS
     loaded = None
     try:
         log.info(
@@ -69,7 +94,7 @@ def load_or_generate_openpgp_install_params(filename) -> OpenPGPAppletInstallPar
 
 def load_or_generate_openpgp_pins(filename) -> OpenPGPPins:
     """Load an OpenPGP pins file, if one exists, or generate one."""
-    log = _LOG.getChild("load_or_generate_openpgp_pins")
+    log = _LOG_LOAD_PINS
     loaded = None
     try:
         log.info(
@@ -99,24 +124,20 @@ def install_and_init_applet(
     current_params: Optional[GPParameters] = None,
 ):
     """Install the SmartPGP applet with the specified serial number."""
-    log = _LOG.getChild("install_and_init_applet")
-    # Try uninstalling first
-    log.info("Uninstalling OpenPGP in case it already exists")
-    gp.uninstall(
-        smartpgp.cap_file,
-        current_params=current_params,
-        verbose=verbose,
-    )
-
-    # Install applet
-    log.info("Installing SmartPGP with serial number %s", install_params.sn)
-    gp.install(
-        smartpgp.cap_file,
-        current_params=current_params,
-        verbose=verbose,
-        default_selected=False,  # not required
-        extra_args=smartpgp.compute_extra_args(install_params),
-    )
+    log = _LOG_INSTALL
+    cap_file = smartpgp.cap_file
+    with gp.batch(current_params=current_params, verbose=verbose) as batch:
+        # Try uninstalling first
+        log.info("Uninstalling OpenPGP in case it already exists")
+        batch.uninstall(cap_file)
+
+        # Install applet
+        log.info("Installing SmartPGP with serial number %s", install_params.sn)
+        batch.install(
+            cap_file,
+            default_selected=False,  # not required
+            extra_args=smartpgp.compute_extra_args(install_params),
+        )
     # Init applet
     click.echo("\n\nPlease remove the card and re-insert it\n\n")
 
@@ -137,36 +158,24 @@ def install_and_init_applet(
     default=False,
     help="Verbose logging",
 )
-def produce(production_file, verbose):
+@click.pass_context
+def produce(ctx, production_file, verbose):
     """Set up a card with SmartPGP."""
-    if verbose:
-        logging.basicConfig(level=logging.DEBUG)
-    else:
-        logging.basicConfig(level=logging.INFO)
-    log = _LOG.getChild("produce")
+    verbose = setup_command(ctx, verbose)
+    log = _LOG_PRODUCE
 
-    with open(production_file, "r", encoding="utf-8") as fp:
-        config_dict = toml.load(fp)
-        config: ProcedureConfig = ProcedureConfig.from_dict(config_dict)  # type: ignore
+    config_dict = load_toml(production_file)
+    config = ProcedureConfig.from_dict(config_dict)
 
-    import pprint
+    if verbose:
+        import pprint
 
-    pprint.pprint(config)
+        pprint.pprint(config)
 
     # Load or generate GP parameters, to lock the card when done
-    current_gp_parameters: Optional[GPParameters] = None
-    desired_gp_parameters: Optional[GPParameters] = None
-
-    if config.gp_config.desired_parameters_filename:
-        desired_gp_parameters = load_or_generate_gp_params(
-            config.gp_config.desired_parameters_filename
-        )
-
-    if config.gp_config.current_parameters_filename:
-        # This one must exists, makes no sense to generate the current keys randomly
-        current_gp_parameters = GPParameters.load_toml(
-            config.gp_config.current_parameters_filename
-        )
+    current_gp_parameters, desired_gp_parameters = load_gp_config_params(
+        config.gp_config
+    )
 
     # Load OpenPGP install parameters
     install_params = load_or_generate_openpgp_install_params(
@@ -203,23 +212,9 @@ def produce(production_file, verbose):
         log.info("Skipping applet uninstall/reinstall")
 
     # Change lock key, if requested
-    if desired_gp_parameters is None and current_gp_parameters is not None:
-        log.info("Changing the GP lock key back to default")
-        gp.lock_card(
-            GPParameters(),
-            current_params=current_gp_parameters,
-            verbose=verbose,
-        )
-    elif (
-        desired_gp_parameters is not None
-        and desired_gp_parameters != current_gp_parameters
-    ):
-        log.info("Changing the GP lock key")
-        gp.lock_card(
-            desired_gp_parameters,
-            current_params=current_gp_parameters,
-            verbose=verbose,
-        )
+    change_gp_lock_key(
+        gp, current_gp_parameters, desired_gp_parameters, verbose=verbose
+    )
 
     # Change pins, if requested
     if desired_pins is not None and desired_pins != current_pins:
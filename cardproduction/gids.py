@@ -9,19 +9,30 @@ import logging
 import secrets
 from dataclasses import dataclass
 import subprocess
-from pathlib import Path
-
-from dataclasses_json import dataclass_json
-import toml
+from typing import Iterable
 
 from .pkcs15tool import Pkcs15Tool
 from .pkcs12 import Pkcs12
-from .util import generate_decimal_pin, is_digits, is_hex
+from .util import (
+    generate_decimal_pin,
+    is_digits,
+    load_toml,
+    normalize_hex,
+    require_cap_file,
+    write_dataclass_toml,
+)
 
 _LOG = logging.getLogger(__name__)
 
+# gids-tool command line prefixes, keyed by (verbose, wait)
+_GIDS_TOOL_CMDS = {
+    (False, False): ("gids-tool",),
+    (True, False): ("gids-tool", "--verbose"),
+    (False, True): ("gids-tool", "--wait"),
+    (True, True): ("gids-tool", "--verbose", "--wait"),
+}
+
 
-@dataclass_json
 @dataclass
 class GidsAppletParameters:
     """Parameters required for initialization of a smartcard running GidsApplet."""
@@ -37,24 +48,10 @@ class GidsAppletParameters:
     def check_requirements(self):
         """Raise an error if any of the fields do not meet requirements."""
         # Admin key
-        self.admin_key = self.admin_key.upper()
-        if len(self.admin_key) != 48:
-            raise RuntimeError(
-                f"Admin key must be 48 hex digits, got '{self.admin_key}'"
-            )
-        if not is_hex(self.admin_key):
-            raise RuntimeError(
-                f"Admin key must be only hex digits, got '{self.admin_key}'"
-            )
+        self.admin_key = normalize_hex(self.admin_key, 48, "Admin key")
 
         # Serial num
-        self.sn = self.sn.upper()
-        if len(self.sn) != 32:
-            raise RuntimeError(f"Serial number must be 32 hex digits, got '{self.sn}'")
-        if not is_hex(self.sn):
-            raise RuntimeError(
-                f"Serial number must be only hex digits, got '{self.sn}'"
-            )
+        self.sn = normalize_hex(self.sn, 32, "Serial number")
 
         # PIN - this may be overly strict
         if len(self.pin) != 6:
@@ -65,25 +62,23 @@ class GidsAppletParameters:
     @classmethod
     def generate(cls):
         """Randomly generate suitable values and return an instance."""
-        admin_key = secrets.token_hex(24)
-        sn = secrets.token_hex(16)
+        # One draw for both: 24 bytes of admin key then 16 bytes of serial number
+        raw = secrets.token_hex(40)
+        admin_key = raw[:48]
+        sn = raw[48:]
         pin = generate_decimal_pin(6)
         return cls(admin_key=admin_key, sn=sn, pin=pin)
 
     @classmethod
     def load_toml(cls, path):
         """Load a toml file containing this data."""
-        with open(path, "r", encoding="utf-8") as fp:
-            loaded = toml.load(fp)
-        return cls.from_dict(loaded)  # type: ignore
+        return cls(**load_toml(path))
 
     def write_toml(self, path):
         """Write a toml file containing this data."""
-        with open(path, "w", encoding="utf-8") as fp:
-            toml.dump(self.to_dict(), fp)  # type: ignore
+        write_dataclass_toml(path, self)
 
 
-@dataclass_json
 @dataclass
 class GidsAppletKeyLoading:
     """Parameters for loading a secret key and certificate into a GIDS applet."""
@@ -95,20 +90,17 @@ class GidsAppletKeyLoading:
 class GidsApplet(Pkcs15Tool):
     """Perform interactions with the GidsApplet."""
 
+    _log = _LOG.getChild("GidsApplet")
+
     def __init__(self, cap_file="GidsApplet-import4k-1.3-20231219.cap"):
         """Initialize general parameters about the applet."""
         super().__init__()
-        self.cap_file = Path(cap_file)
-        if not self.cap_file.exists():
-            raise RuntimeError(f"Could not find GidApplet cap file {cap_file}")
+        self.cap_file = require_cap_file(cap_file, "GidsApplet")
 
-        self._log = _LOG.getChild("GidsApplet")
         self._log.debug("Will use cap file %s", cap_file)
 
     def init_card(self, params: GidsAppletParameters, verbose=False, wait=False):
         """Initialize the card with the given parameters."""
-        params.check_requirements()
-
         self._log.info("Initializing GidsApplet")
         cmd = self._gids_tool(verbose=verbose, wait=wait)
         cmd.extend(
@@ -152,10 +144,19 @@ class GidsApplet(Pkcs15Tool):
         self._log.info("Importing %s as %s", loading.key.filename, loading.label)
         subprocess.check_call(cmd)
 
+    def import_keys(
+        self,
+        params: GidsAppletParameters,
+        loadings: Iterable[GidsAppletKeyLoading],
+        verbose=False,
+    ):
+        """
+        Import several private keys and certificates from p12 files.
+
+        pkcs15-init only stores one private key per run, so this is one run each.
+        """
+        for loading in loadings:
+            self.import_key(params, loading, verbose=verbose)
+
     def _gids_tool(self, verbose=False, wait=False):
-        cmd = ["gids-tool"]
-        if verbose:
-            cmd.append("--verbose")
-        if wait:
-            cmd.append("--wait")
-        return cmd
+        return list(_GIDS_TOOL_CMDS[bool(verbose), bool(wait)])
@@ -7,20 +7,16 @@
 import logging
 import secrets
 import subprocess
-from copy import copy
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Iterable, Optional, Union
+from typing import Iterable, Iterator, Optional, Sequence, Union
 
-from dataclasses_json import dataclass_json
-import toml
-
-from .util import is_hex
+from .util import load_toml, normalize_hex, write_dataclass_toml
 
 _LOG = logging.getLogger(__name__)
 
 
-@dataclass_json
-@dataclass
+@dataclass(frozen=True)
 class GPParameters:
     """
     Parameters required for GlobalPlatform usage.
@@ -33,6 +29,9 @@ class GPParameters:
 
     >>> GPParameters("404142434445464748494a4b4c4d4e4f")
     GPParameters(key='404142434445464748494A4B4C4D4E4F')
+
+    >>> len({GPParameters(), GPParameters("404142434445464748494a4b4c4d4e4f")})
+    1
     """
 
     key: str = "404142434445464748494A4B4C4D4E4F"  # 32 hex characters
@@ -45,12 +44,10 @@ class GPParameters:
         """
         Raise an error if any of the fields do not meet requirements.
         """
-        self.key = self.key.upper()
-        # key
-        if len(self.key) != 32:
-            raise RuntimeError("Key must be 32 hex digits")
-        if not is_hex(self.key):
-            raise RuntimeError("Key number must be only hex digits")
+        # The key is a secret: keep it out of any error message
+        key = normalize_hex(self.key, 32, "Key", show_value=False)
+        # Frozen, but normalizing the key is part of construction
+        object.__setattr__(self, "key", key)
 
     @classmethod
     def generate(cls):
@@ -66,23 +63,24 @@ class GPParameters:
     @classmethod
     def load_toml(cls, path):
         """Load a toml file containing this data."""
-        with open(path, "r", encoding="utf-8") as fp:
-            loaded = toml.load(fp)
-        return cls.from_dict(loaded)  # type: ignore
+        return cls(**load_toml(path))
 
     def write_toml(self, path):
         """Write a toml file containing this data."""
-        with open(path, "w", encoding="utf-8") as fp:
-            toml.dump(self.to_dict(), fp)  # type: ignore
+        write_dataclass_toml(path, self)
+
+
+# The well-known default key; shared since GPParameters is frozen
+DEFAULT_GP_PARAMETERS = GPParameters()
 
 
 class GP:
     """Wrapper for the GlobalPlatformPro command line tool."""
 
+    _log = _LOG.getChild("GP")
+
     def __init__(self, invocation_cmd: Union[str, Iterable[str], None] = None):
         """Initialize the GP tool wrapper object."""
-        self._log = _LOG.getChild("GP")
-
         if invocation_cmd is None:
             self.invocation_cmd = ["java", "-jar", "gp.jar"]
         elif isinstance(invocation_cmd, str):
@@ -91,16 +89,18 @@ class GP:
             # some iterable
             self.invocation_cmd = list(invocation_cmd)
 
+        # Command line prefixes for _make_cmd, built once
+        self._cmd_quiet = tuple(self.invocation_cmd)
+        self._cmd_verbose = self._cmd_quiet + ("--verbose",)
+
     def _make_cmd(
         self,
         verbose=False,
         current_params: Optional[GPParameters] = None,
     ):
-        cmd = copy(self.invocation_cmd)
-        if verbose:
-            cmd.append("--verbose")
+        cmd = list(self._cmd_verbose if verbose else self._cmd_quiet)
         if current_params:
-            current_params.enforce_requirements()
+            # Already validated at construction, and GPParameters is frozen
             cmd.extend(("--key", current_params.key))
         return cmd
 
@@ -125,18 +125,12 @@ class GP:
         cap_file,
         default_selected=True,
         verbose=False,
-        extra_args: Optional[list[str]] = None,
+        extra_args: Optional[Sequence[str]] = None,
         **kwargs,
     ):
         """Install an applet."""
         cmd = self._make_cmd(verbose=verbose, **kwargs)
-        cmd.extend(("--install", str(cap_file)))
-
-        if default_selected:
-            cmd.append("--default")
-
-        if extra_args:
-            cmd.extend(extra_args)
+        cmd.extend(_install_args(cap_file, default_selected, extra_args))
 
         self._log.info("Installing %s", cap_file)
         subprocess.check_call(cmd)
@@ -150,8 +144,7 @@ class GP:
         """Set the GP lock key."""
         if not current_params:
             # Use default
-            current_params = GPParameters()
-        new_params.enforce_requirements()
+            current_params = DEFAULT_GP_PARAMETERS
         self._log.info(
             "Changing GP lock key from %s to %s", current_params.key, new_params.key
         )
@@ -160,6 +153,78 @@ class GP:
         cmd.extend(("--lock", new_params.key))
         subprocess.check_call(cmd)
 
+    @contextmanager
+    def batch(
+        self,
+        verbose=False,
+        current_params: Optional[GPParameters] = None,
+    ) -> Iterator["GPBatch"]:
+        """
+        Collect several operations to perform in a single gp invocation.
+
+        The operations are run when the with block exits without an exception,
+        saving a JVM start-up (and card session) for each one after the first.
+        If that fails and the batch has uninstalls, which are allowed to fail as
+        with GP.uninstall, the rest of the batch is retried without them.
+        """
+        batch = GPBatch()
+        yield batch
+        if not batch.uninstall_args and not batch.args:
+            return
+
+        cmd = self._make_cmd(verbose=verbose, current_params=current_params)
+        self._log.info("Running in one gp invocation: %s", ", ".join(batch.steps))
+        retcode = subprocess.call(cmd + batch.uninstall_args + batch.args)
+        if retcode == 0:
+            return
+        if not batch.uninstall_args:
+            raise subprocess.CalledProcessError(retcode, cmd + batch.args)
+
+        self._log.info(
+            "gp invocation failed, maybe because an applet to uninstall is not "
+            "installed: retrying without the uninstall"
+        )
+        if batch.args:
+            subprocess.check_call(cmd + batch.args)
+
+
+class GPBatch:
+    """Operations queued by GP.batch, run together when the batch ends."""
+
+    def __init__(self):
+        """Start an empty batch."""
+        self.uninstall_args: list[str] = []
+        self.args: list[str] = []
+        self.steps: list[str] = []
+
+    def uninstall(self, cap_file):
+        """Queue uninstalling an applet: as with GP.uninstall, failure is allowed."""
+        self.uninstall_args.extend(("--uninstall", str(cap_file)))
+        self.steps.append(f"uninstall {cap_file}")
+
+    def install(
+        self,
+        cap_file,
+        default_selected=True,
+        extra_args: Optional[Sequence[str]] = None,
+    ):
+        """Queue installing an applet."""
+        self.args.extend(_install_args(cap_file, default_selected, extra_args))
+        self.steps.append(f"install {cap_file}")
+
+
+def _install_args(
+    cap_file,
+    default_selected: bool,
+    extra_args: Optional[Sequence[str]],
+) -> list[str]:
+    args = ["--install", str(cap_file)]
+    if default_selected:
+        args.append("--default")
+    if extra_args:
+        args.extend(extra_args)
+    return args
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
@@ -173,5 +238,7 @@ if __name__ == "__main__":
     gp.lock_card(random_key_params, verbose=True)
 
     gp.lock_card(
-        new_params=GPParameters(), current_params=random_key_params, verbose=True
+        new_params=DEFAULT_GP_PARAMETERS,
+        current_params=random_key_params,
+        verbose=True,
     )
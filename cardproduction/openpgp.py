@@ -8,21 +8,26 @@
 import logging
 import secrets
 from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
 from typing import Optional
 import tempfile
 import subprocess
 
-from dataclasses_json import dataclass_json
-import toml
-
-from .util import generate_decimal_pin, is_digits, is_hex
+from .util import (
+    generate_decimal_pin,
+    is_digits,
+    is_hex,
+    load_toml,
+    normalize_hex,
+    require_cap_file,
+    write_dataclass_toml,
+)
 
 _LOG = logging.getLogger(__name__)
 
 
-@dataclass_json
-@dataclass
+@dataclass(frozen=True)
 class OpenPGPAppletInstallParameters:
     """Parameters required for installation of an OpenPGP applet on a smartcard."""
 
@@ -36,18 +41,18 @@ class OpenPGPAppletInstallParameters:
         """Check the requirements after init."""
         self.check_requirements()
 
-    def is_manufacturer_reserved_for_random_sn(self):
+    @cached_property
+    def is_manufacturer_reserved_for_random_sn(self) -> bool:
         """Check if the manufacturer code is for unmanaged random serial numbers."""
-        # checking in here since we require these assumptions to be true
-        self._check_mfr_code_requirements()
-
+        # The code was checked and lower-cased in __post_init__, and is frozen
         return (
             self.manufacturer_code.startswith("fff")
             and self.manufacturer_code[-1] != "f"
         )
 
     def _check_mfr_code_requirements(self):
-        self.manufacturer_code = self.manufacturer_code.lower()
+        # Frozen, but normalizing the code is part of construction
+        object.__setattr__(self, "manufacturer_code", self.manufacturer_code.lower())
         if len(self.manufacturer_code) != 4:
             raise RuntimeError(
                 f"Manufacturer must be 4 hex digits, got '{self.manufacturer_code}'"
@@ -60,16 +65,10 @@ class OpenPGPAppletInstallParameters:
     def check_requirements(self):
         """Raise an error if any of the fields do not meet requirements."""
         # Serial num
-        self.sn = self.sn.upper()
-        if len(self.sn) != 8:
-            raise RuntimeError(f"Serial number must be 8 hex digits, got '{self.sn}'")
-        if not is_hex(self.sn):
-            raise RuntimeError(
-                f"Serial number must be only hex digits, got '{self.sn}'"
-            )
+        object.__setattr__(self, "sn", normalize_hex(self.sn, 8, "Serial number"))
 
         self._check_mfr_code_requirements()
-        in_random_range = self.is_manufacturer_reserved_for_random_sn()
+        in_random_range = self.is_manufacturer_reserved_for_random_sn
         if not in_random_range:
             _LOG.warning(
                 "Specified manufacturer code %s is not in the unmanaged "
@@ -82,7 +81,7 @@ class OpenPGPAppletInstallParameters:
         """Randomly generate suitable values and return an instance."""
         sn = secrets.token_hex(4)
         ret = cls(sn=sn)
-        if not ret.is_manufacturer_reserved_for_random_sn():
+        if not ret.is_manufacturer_reserved_for_random_sn:
             raise RuntimeError(
                 "The specified manufacturer code is not reserved for random assignment."
             )
@@ -91,18 +90,14 @@ class OpenPGPAppletInstallParameters:
     @classmethod
     def load_toml(cls, path):
         """Load a toml file containing this data."""
-        with open(path, "r", encoding="utf-8") as fp:
-            loaded = toml.load(fp)
-        return cls.from_dict(loaded)  # type: ignore
+        return cls(**load_toml(path))
 
     def write_toml(self, path):
         """Write a toml file containing this data."""
-        with open(path, "w", encoding="utf-8") as fp:
-            toml.dump(self.to_dict(), fp)  # type: ignore
+        write_dataclass_toml(path, self)
 
 
-@dataclass_json
-@dataclass
+@dataclass(frozen=True)
 class OpenPGPPins:
     """Parameters required for initialization of a smartcard with an OpenPGP applet."""
 
@@ -139,14 +134,15 @@ class OpenPGPPins:
     @classmethod
     def load_toml(cls, path) -> "OpenPGPPins":
         """Load a toml file containing this data."""
-        with open(path, "r", encoding="utf-8") as fp:
-            loaded = toml.load(fp)
-        return cls.from_dict(loaded)  # type: ignore
+        return cls(**load_toml(path))
 
     def write_toml(self, path):
         """Write a toml file containing this data."""
-        with open(path, "w", encoding="utf-8") as fp:
-            toml.dump(self.to_dict(), fp)  # type: ignore
+        write_dataclass_toml(path, self)
+
+
+# The applet's factory default PINs, only ever read
+_DEFAULT_PINS = OpenPGPPins()
 
 
 def _make_pin_ascii_string(pin: str, delim: str = ""):
@@ -159,13 +155,24 @@ def _make_pin_ascii_string(pin: str, delim: str = ""):
     >>> _make_pin_ascii_string("123456", ":")
     '31:32:33:34:35:36'
 
+    >>> _make_pin_ascii_string("1234", ", ")
+    '31, 32, 33, 34'
+
     """
-    return delim.join(f"{ord(digit):02x}" for digit in pin)
+    raw = pin.encode("ascii")
+    if not delim:
+        return raw.hex()
+    # bytes.hex only takes a single-character separator
+    if len(delim) == 1:
+        return raw.hex(delim)
+    return delim.join(f"{b:02x}" for b in raw)
 
 
 class SmartPGPApplet:
     """Perform interactions with the SmartPGP applet."""
 
+    _log = _LOG.getChild("SmartPGPApplet")
+
     def __init__(
         self,
         cap_file="SmartPGP-v1.22.2-jc304-without_sm-rsa_up_to_4096.cap",
@@ -181,18 +188,17 @@ class SmartPGPApplet:
 
         # import smartpgp.highlevel as pgp
 
-        self.cap_file = Path(cap_file)
-        if not self.cap_file.exists():
-            raise RuntimeError(f"Could not find SmartPGP cap file {cap_file}")
+        self.cap_file = require_cap_file(cap_file, "SmartPGP")
 
-        self._log = _LOG.getChild("SmartPGPApplet")
         self._log.debug("Will use cap file %s", cap_file)
 
-    def compute_extra_args(self, params: OpenPGPAppletInstallParameters):
-        """Compute the "extra_args" list for GP.install."""
-        params.check_requirements()
+    def compute_extra_args(
+        self, params: OpenPGPAppletInstallParameters
+    ) -> tuple[str, str]:
+        """Compute the "extra_args" for GP.install."""
+        # params was validated at construction and is frozen
         aid = f"d276000124010304{params.manufacturer_code}{params.sn}0000"
-        return ["--create", aid]
+        return ("--create", aid)
 
     def change_pins(
         self,
@@ -203,7 +209,7 @@ class SmartPGPApplet:
     ):
         """Change the user and admin pins."""
         if not current_pins:
-            current_pins = OpenPGPPins()
+            current_pins = _DEFAULT_PINS
 
         current_admin_pin_ascii = _make_pin_ascii_string(current_pins.admin_pin)
         current_admin_pin_ascii_colons = _make_pin_ascii_string(
@@ -220,7 +226,7 @@ class SmartPGPApplet:
 
         with tempfile.NamedTemporaryFile("w", encoding="utf-8", delete=False) as script:
             try:
-                script.writelines(cmds)
+                script.write("".join(cmds))
                 script.close()
 
                 self._log.info(f"Wrote commands to {script.name}")
@@ -8,11 +8,9 @@
 
 from dataclasses import dataclass
 from typing import Optional
-from dataclasses_json import dataclass_json
 
 
-@dataclass_json
-@dataclass
+@dataclass(frozen=True)
 class Pkcs12:
     """Represent a PKCS#12 file with private key and certificate."""
 
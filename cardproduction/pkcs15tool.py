@@ -13,29 +13,27 @@ from .util import handle_opensc_common_args
 
 
 _LOG = logging.getLogger(__name__)
-_CERT_LABEL_RE = re.compile(r"^X.509 Certificate \[(?P<label>[^\]]+)]$")
+# Matched against the whole output at once, so the label must not span lines
+_CERT_LABEL_RE = re.compile(
+    rb"^[ \t]*X\.509 Certificate \[(?P<label>[^\]\r\n]+)\][ \t\r]*$", re.MULTILINE
+)
 
 
 class Pkcs15Tool:
     """Generic pkcs15-tool interaction."""
 
+    _log = _LOG.getChild("Pkcs15Tool")
+
     def __init__(self, pkcs15tool: str = "pkcs15-tool") -> None:
-        """Initialize logger in tool."""
+        """Initialize the tool, optionally with a different pkcs15-tool path."""
         self._pkcs15tool = pkcs15tool
-        self._log = _LOG.getChild("Pkcs15Tool")
 
     def enumerate_certificates(self, verbose=False, **kwargs) -> list[str]:
         """Get a list of key/certificate labels."""
         cmd = [self._pkcs15tool, "--list-certificates"]
         handle_opensc_common_args(cmd, verbose=verbose, **kwargs)
         output = subprocess.check_output(cmd)
-
-        ret = []
-        for line in output.splitlines():
-            m = _CERT_LABEL_RE.match(line.decode().strip())
-            if m:
-                ret.append(m["label"])
-        return ret
+        return [m["label"].decode() for m in _CERT_LABEL_RE.finditer(output)]
 
 
 if __name__ == "__main__":
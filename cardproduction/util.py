@@ -5,8 +5,24 @@
 # Original author: Rylie Pavlik <rylie.pavlik@collabora.com>
 """General functionality without a better home."""
 
-from random import randint
-from typing import Optional
+import os
+import re
+import secrets
+import sys
+from dataclasses import fields
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+import tomli_w
+
+_HEX_RE = re.compile(r"[0-9a-fA-F]*")
+_DIGITS_RE = re.compile(r"[0-9]*")
 
 
 def is_hex(s: str) -> bool:
@@ -25,6 +41,9 @@ def is_hex(s: str) -> bool:
     >>> is_hex("badf00d")
     True
 
+    >>> is_hex("BADF00D")
+    True
+
     >>> is_hex("bad²f00d")
     False
 
@@ -34,7 +53,45 @@ def is_hex(s: str) -> bool:
     >>> is_hex("feedthebed")
     False
     """
-    return all(c in "01234567890abcdef" for c in s.lower())
+    return _HEX_RE.fullmatch(s) is not None
+
+
+@lru_cache(maxsize=128)
+def normalize_hex(s: str, length: int, what: str, show_value: bool = True) -> str:
+    """
+    Upper-case a hex string, raising an error if it is not the right length.
+
+    Pass show_value=False for secrets, to keep the rejected value out of the
+    error message (and so out of logs and tracebacks).
+
+    Results are cached and interned, so validating the same value repeatedly,
+    as happens when the same parameter file is loaded again, is cheap.
+
+    >>> normalize_hex("badf00d5", 8, "Serial number")
+    'BADF00D5'
+
+    >>> normalize_hex("badf00d", 8, "Serial number")
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Serial number must be 8 hex digits, got 'BADF00D'
+
+    >>> normalize_hex("feedthebed", 10, "Serial number")
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Serial number must be only hex digits, got 'FEEDTHEBED'
+
+    >>> normalize_hex("badf00d", 8, "Key", show_value=False)
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Key must be 8 hex digits
+    """
+    s = s.upper()
+    got = f", got '{s}'" if show_value else ""
+    if len(s) != length:
+        raise RuntimeError(f"{what} must be {length} hex digits{got}")
+    if not is_hex(s):
+        raise RuntimeError(f"{what} must be only hex digits{got}")
+    return sys.intern(s)
 
 
 # def check_length(param_name: str, param, required_)
@@ -65,7 +122,7 @@ def is_digits(s: str) -> bool:
     >>> is_digits("feedthebed")
     False
     """
-    return all(c in "0123456789" for c in s)
+    return _DIGITS_RE.fullmatch(s) is not None
 
 
 def generate_decimal_pin(digits: int) -> str:
@@ -81,7 +138,20 @@ def generate_decimal_pin(digits: int) -> str:
     >>> is_digits(generate_decimal_pin(6))
     True
     """
-    return "".join(str(randint(0, 9)) for _ in range(digits))
+    return f"{secrets.randbelow(10**digits):0{digits}d}"
+
+
+@lru_cache(maxsize=16)
+def require_cap_file(cap_file, applet_name: str) -> Path:
+    """
+    Return the path to an applet cap file, raising an error if it does not exist.
+
+    Only found files are cached, so a missing one is looked for again next time.
+    """
+    path = Path(cap_file)
+    if not path.exists():
+        raise RuntimeError(f"Could not find {applet_name} cap file {cap_file}")
+    return path
 
 
 def handle_opensc_common_args(
@@ -100,3 +170,32 @@ def handle_opensc_common_args(
         cmd.extend(("--reader", str(reader)))
     if aid is not None:
         cmd.extend(("--aid", aid))
+
+
+def load_toml(path) -> dict[str, Any]:
+    """
+    Parse a TOML file into a dictionary.
+
+    Parsed results are reused for the rest of the process as long as the file's
+    modification time and size are unchanged, so treat the returned dictionary
+    as read-only.
+    """
+    st = os.stat(path)
+    return _load_toml_cached(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=32)
+def _load_toml_cached(path: str, mtime_ns: int, size: int) -> dict[str, Any]:
+    return tomllib.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def write_toml(path, data: dict[str, Any]):
+    """Write a dictionary to a TOML file."""
+    with open(path, "wb") as fp:
+        tomli_w.dump(data, fp)
+
+
+def write_dataclass_toml(path, obj):
+    """Write the fields of a flat dataclass instance to a TOML file."""
+    # Shallow on purpose: asdict() would deep-copy every value
+    write_toml(path, {f.name: getattr(obj, f.name) for f in fields(obj)})